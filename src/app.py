@@ -1,9 +1,11 @@
 # Реализуем RAG - поиск и генерацию ответа
 
 import os
+import json
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Optional
 import requests
+import httpx
 from src.data_processing.vector_db import VectorDB
 from dotenv import load_dotenv
 
@@ -15,6 +17,9 @@ logger = logging.getLogger(__name__)
 # Load environment variables from .env.example in project root
 load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / '.env.example')
 
+YANDEX_COMPLETION_URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+YANDEX_TIMEOUT = float(os.getenv('YANDEX_TIMEOUT', '60'))
+
 # Uncomment below for OpenAI
 # from openai import OpenAI
 # client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -35,6 +40,9 @@ class LegalRAG:
         # Get other settings from environment
         self.top_k = int(os.getenv('TOP_K_RESULTS', '3'))
         
+        # Shared async HTTP client (keeps connections to YandexGPT alive); see http()
+        self.http_client: Optional[httpx.AsyncClient] = None
+        
     def format_prompt(self, query: str, relevant_chunks: List[Dict[str, Any]]) -> str:
         """Format the prompt for the LLM."""
         context = []
@@ -73,9 +81,8 @@ class LegalRAG:
 """
         return prompt
     
-    def get_yandex_answer(self, prompt: str) -> str:
-        """Get answer from YandexGPT."""
-        url = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+    def _yandex_request(self, prompt: str, stream: bool = False) -> tuple[Dict[str, str], Dict[str, Any]]:
+        """Build headers and payload for a YandexGPT completion request."""
         headers = {
             "Authorization": f"Api-Key {self.yandex_api_key}",
             "x-folder-id": self.yandex_folder_id,
@@ -84,7 +91,7 @@ class LegalRAG:
         data = {
             "modelUri": f"gpt://{self.yandex_folder_id}/yandexgpt-lite",
             "completionOptions": {
-                "stream": False,
+                "stream": stream,
                 "temperature": 0.6,
                 "maxTokens": 2000
             },
@@ -99,9 +106,14 @@ class LegalRAG:
                 }
             ]
         }
+        return headers, data
+    
+    def get_yandex_answer(self, prompt: str) -> str:
+        """Get answer from YandexGPT."""
+        headers, data = self._yandex_request(prompt)
         
         try:
-            response = requests.post(url, headers=headers, json=data)
+            response = requests.post(YANDEX_COMPLETION_URL, headers=headers, json=data)
             response.raise_for_status()
             result = response.json()
             return result["result"]["alternatives"][0]["message"]["text"]
@@ -109,6 +121,56 @@ class LegalRAG:
             print(f"Error calling YandexGPT: {str(e)}")
             return self.get_openai_fallback(prompt)
     
+    def http(self) -> httpx.AsyncClient:
+        """Async HTTP client reused by all YandexGPT calls; created on first use."""
+        if self.http_client is None or self.http_client.is_closed:
+            self.http_client = httpx.AsyncClient(timeout=YANDEX_TIMEOUT)
+        return self.http_client
+    
+    async def aclose(self):
+        """Close the shared async HTTP client."""
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+    
+    async def aget_yandex_answer(self, prompt: str) -> str:
+        """Get answer from YandexGPT without blocking the event loop."""
+        headers, data = self._yandex_request(prompt)
+        
+        try:
+            response = await self.http().post(YANDEX_COMPLETION_URL, headers=headers, json=data)
+            response.raise_for_status()
+            result = response.json()
+            return result["result"]["alternatives"][0]["message"]["text"]
+        except Exception as e:
+            logger.error(f"Error calling YandexGPT: {str(e)}")
+            return self.get_openai_fallback(prompt)
+    
+    async def astream_yandex_answer(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Stream answer from YandexGPT.
+        
+        YandexGPT sends one JSON object per line with the full text generated
+        so far, so only the new suffix is yielded.
+        """
+        headers, data = self._yandex_request(prompt, stream=True)
+        sent = 0
+        
+        try:
+            async with self.http().stream("POST", YANDEX_COMPLETION_URL, headers=headers, json=data) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    text = json.loads(line)["result"]["alternatives"][0]["message"]["text"]
+                    if len(text) > sent:
+                        yield text[sent:]
+                        sent = len(text)
+        except Exception as e:
+            logger.error(f"Error streaming from YandexGPT: {str(e)}")
+            if not sent:
+                yield self.get_openai_fallback(prompt)
+    
     def get_openai_fallback(self, prompt: str) -> str:
         """Fallback to OpenAI if YandexGPT fails."""
         # Uncomment and modify below to use OpenAI
@@ -141,6 +203,10 @@ class LegalRAG:
             date = chunk.get("дата", "неизвестна")
             sources.add(f"Решение суда №{case_number} от {date}")
             articles.update(chunk.get("статьи", []))
+            
+            # Same passage found in other decisions (collapsed at indexing)
+            for dup in chunk.get("дубликаты", []):
+                sources.add(f"Решение суда №{dup.get('номер_дела', 'неизвестен')} от {dup.get('дата', 'неизвестна')}")
         
         # Format output
         output = [
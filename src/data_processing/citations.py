@@ -0,0 +1,223 @@
+# Ссылки на статьи кодексов: извлечение за один проход и индекс "статья -> дела/чанки"
+
+import re
+import json
+from collections import defaultdict
+from itertools import combinations
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple
+
+# Canonical code name -> regex for the ways it is written in decisions
+CODES = {
+    "ГК РФ": r"ГК(?:\s*РФ)?|Гражданск\w*\s+кодекс\w*(?:\s+Российской\s+Федерации)?",
+    "АПК РФ": r"АПК(?:\s*РФ)?|Арбитражн\w*\s+процессуальн\w*\s+кодекс\w*(?:\s+Российской\s+Федерации)?",
+    "НК РФ": r"НК(?:\s*РФ)?|Налогов\w*\s+кодекс\w*(?:\s+Российской\s+Федерации)?",
+    "КоАП РФ": r"КоАП(?:\s*РФ)?|Кодекс\w*(?:\s+Российской\s+Федерации)?\s+об\s+административных\s+правонарушениях",
+}
+CODE_ORDER = list(CODES)
+_CODE_GROUPS = {f"code{i}": code for i, code in enumerate(CODES)}
+
+_NUMBER = r"\d+(?:\.\d+)*"
+_ARTICLE_WORD = r"(?:\b[Сс]т\.|\b[Сс]тат(?:ь\w*|ей)\b)"
+# \b after every code, so "НКО" or "ГКУ" are not taken for НК / ГК
+_CODES_ALTERNATION = "|".join(f"(?P<{group}>(?:{CODES[code]})\\b)" for group, code in _CODE_GROUPS.items())
+
+# One compiled pattern for all codes: "ст. 333.40 НК РФ", "статьями 110, 112 АПК РФ",
+# "ст. 49, ст. 150 АПК РФ", "статьи 395 Гражданского кодекса Российской Федерации",
+# "статей 167-170, 176 АПК РФ"
+ARTICLE_PATTERN = re.compile(
+    rf"{_ARTICLE_WORD}\s*"
+    rf"(?P<numbers>{_NUMBER}(?:\s*(?:,|\bи\b|[–—-])\s*(?:{_ARTICLE_WORD}\s*)?{_NUMBER})*)"
+    rf"\s*(?:{_CODES_ALTERNATION})"
+)
+_NUMBER_PATTERN = re.compile(_NUMBER)
+# "167 – 171" inside a list of article numbers
+_RANGE_PATTERN = re.compile(rf"(?P<first>\d+)\s*[–—-]\s*(?P<last>\d+)(?![.\d])|{_NUMBER}")
+MAX_ARTICLE_RANGE = 50
+_CODE_PATTERN = re.compile(_CODES_ALTERNATION)
+
+
+def article_id(number: str, code: Optional[str] = None) -> str:
+    """Normalized article id: "ст.333.40 НК РФ" or "ст.333.40" when the code is unknown."""
+    return f"ст.{number} {code}" if code else f"ст.{number}"
+
+
+def _sort_key(article: str) -> Tuple[int, Tuple[int, ...], str]:
+    number = _NUMBER_PATTERN.search(article)
+    code = article.split(" ", 1)[1] if " " in article else ""
+    code_rank = CODE_ORDER.index(code) if code in CODE_ORDER else len(CODE_ORDER)
+    digits = tuple(int(part) for part in number.group().split(".")) if number else ()
+    return code_rank, digits, article
+
+
+def normalize_article(ref: str) -> Optional[str]:
+    """
+    Bring any article reference to the article_id() form.
+
+    Accepts "ст.137", "Статья 395 ГК РФ", "ст. 49 АПК РФ", "333.40 НК" and so on.
+    Returns None if there is no article number in the string.
+    """
+    number = _NUMBER_PATTERN.search(ref)
+    if not number:
+        return None
+    code = _CODE_PATTERN.search(ref[number.end():])
+    return article_id(number.group(), _CODE_GROUPS[code.lastgroup] if code else None)
+
+
+def _article_numbers(numbers: str) -> List[str]:
+    """Split "102, 110, 167 – 171" into single article numbers, expanding ranges."""
+    result = []
+    for match in _RANGE_PATTERN.finditer(numbers):
+        if match.group("first"):
+            first, last = int(match.group("first")), int(match.group("last"))
+            if first < last <= first + MAX_ARTICLE_RANGE:
+                result.extend(str(n) for n in range(first, last + 1))
+            else:
+                result.extend([match.group("first"), match.group("last")])
+        else:
+            result.append(match.group())
+    return result
+
+
+def extract_articles(text: str) -> List[str]:
+    """Extract ГК/АПК/НК/КоАП article references in one pass over the text."""
+    articles = set()
+    for match in ARTICLE_PATTERN.finditer(text):
+        code = _CODE_GROUPS[match.lastgroup]
+        for number in _article_numbers(match.group("numbers")):
+            articles.add(article_id(number, code))
+    return sorted(articles, key=_sort_key)
+
+
+def resolve_codeless(articles: Iterable[str]) -> Set[str]:
+    """Replace "ст.110" with "ст.110 АПК РФ" etc. when the same set already has the coded id."""
+    articles = set(articles)
+    coded_by_number: Dict[str, Set[str]] = defaultdict(set)
+    for article in articles:
+        if " " in article:
+            coded_by_number[article.split(" ", 1)[0]].add(article)
+
+    resolved = set()
+    for article in articles:
+        if " " in article:
+            resolved.add(article)
+        else:
+            resolved.update(coded_by_number.get(article) or {article})
+    return resolved
+
+
+class CitationIndex:
+    """
+    Precomputed article -> documents / chunks map with co-citation counts.
+
+    Chunks are positions in VectorDB.documents. Two articles are co-cited
+    once per document that references both of them.
+    """
+
+    def __init__(self):
+        self.documents: Dict[str, Set[str]] = defaultdict(set)
+        self.chunks: Dict[str, Set[int]] = defaultdict(set)
+        self.co_citations: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        # "ст.333.40" -> {"ст.333.40 НК РФ", "ст.333.40"}: lookups without a code
+        self._by_number: Dict[str, Set[str]] = defaultdict(set)
+
+    @classmethod
+    def from_metadata(cls, metadata: List[Dict[str, Any]], doc_ids: List[str]) -> "CitationIndex":
+        """
+        Build the index from chunk metadata.
+
+        Args:
+            metadata: VectorDB.documents
+            doc_ids: Document id of every chunk (same length as metadata)
+        """
+        index = cls()
+        doc_articles: Dict[str, Set[str]] = defaultdict(set)
+
+        for pos, (meta, doc_id) in enumerate(zip(metadata, doc_ids)):
+            for ref in meta.get("статьи", []):
+                article = normalize_article(ref)
+                if article:
+                    doc_articles[doc_id].add(article)
+
+            chunk_text = meta.get(meta.get("section", ""), "")
+            chunk_articles = extract_articles(chunk_text)
+            for article in chunk_articles:
+                index.chunks[article].add(pos)
+                doc_articles[doc_id].add(article)
+
+            # Collapsed near-duplicates share this chunk but keep their own documents
+            for dup in meta.get("дубликаты", []):
+                dup_doc = dup.get("документ") or doc_id
+                doc_articles[dup_doc].update(chunk_articles)
+                doc_articles[dup_doc].update(filter(None, map(normalize_article, dup.get("статьи", []))))
+
+        for doc_id, articles in doc_articles.items():
+            index.add_document(doc_id, resolve_codeless(articles))
+
+        return index
+
+    def add_document(self, doc_id: str, articles: Iterable[str]):
+        """
+        Register a document's articles.
+
+        Ids without a code are still findable, but they are left out of the
+        co-citation counts: "ст.110" may be the same article as "ст.110 АПК РФ".
+        """
+        articles = sorted(set(articles))
+        for article in articles:
+            self.documents[article].add(doc_id)
+            self._by_number[article.split(" ", 1)[0]].add(article)
+        coded = [article for article in articles if " " in article]
+        for a, b in combinations(coded, 2):
+            self.co_citations[a][b] += 1
+            self.co_citations[b][a] += 1
+
+    def _resolve(self, article: str) -> Set[str]:
+        """Normalized ids matching a query; a reference without a code matches all codes."""
+        article = normalize_article(article)
+        if article is None:
+            return set()
+        if " " in article:
+            return {article}
+        return self._by_number.get(article, set())
+
+    def documents_citing(self, article: str) -> Set[str]:
+        """Ids of documents that cite the article."""
+        return set().union(*(self.documents.get(a, set()) for a in self._resolve(article)))
+
+    def chunks_citing(self, article: str) -> Set[int]:
+        """Positions of chunks whose text cites the article."""
+        return set().union(*(self.chunks.get(a, set()) for a in self._resolve(article)))
+
+    def co_cited(self, article: str, n: int = 10) -> List[Tuple[str, int]]:
+        """Articles most often cited together with the given one."""
+        counts: Dict[str, int] = defaultdict(int)
+        for a in self._resolve(article):
+            for other, count in self.co_citations.get(a, {}).items():
+                counts[other] += count
+        return sorted(counts.items(), key=lambda item: (-item[1], _sort_key(item[0])))[:n]
+
+    def save(self, path: Path):
+        data = {
+            "documents": {a: sorted(docs) for a, docs in self.documents.items()},
+            "chunks": {a: sorted(positions) for a, positions in self.chunks.items()},
+            "co_citations": {a: dict(others) for a, others in self.co_citations.items()},
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path: Path) -> "CitationIndex":
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        index = cls()
+        for article, docs in data["documents"].items():
+            index.documents[article] = set(docs)
+            index._by_number[article.split(" ", 1)[0]].add(article)
+        for article, positions in data["chunks"].items():
+            index.chunks[article] = set(positions)
+            index._by_number[article.split(" ", 1)[0]].add(article)
+        for article, others in data["co_citations"].items():
+            index.co_citations[article].update(others)
+        return index
@@ -0,0 +1,104 @@
+# Поиск почти одинаковых чанков (MinHash + LSH) перед построением эмбеддингов
+
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+
+@dataclass
+class DedupResult:
+    keep: List[int]                       # positions of chunks to embed, in original order
+    duplicates: Dict[int, List[int]]      # kept position -> collapsed positions
+    chunks_saved: int = 0
+    bytes_saved: int = 0
+    clusters: int = field(init=False)
+
+    def __post_init__(self):
+        self.clusters = len(self.duplicates)
+
+
+class NearDuplicateDetector:
+    """
+    Groups chunks whose word-shingle Jaccard similarity is above a threshold.
+
+    MinHash signatures are compared through LSH bands, so only chunks that
+    share a band bucket are checked; the estimated similarity of a candidate
+    pair must still reach the threshold.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = self._choose_bands(threshold, num_perm)
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    @staticmethod
+    def _choose_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+        """Band split whose S-curve midpoint (1/b)^(1/r) is closest to the threshold."""
+        options = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+        return min(options, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+    def shingles(self, text: str) -> np.ndarray:
+        words = text.lower().split()
+        n = self.shingle_size
+        grams = [" ".join(words[i:i + n]) for i in range(max(len(words) - n + 1, 1))]
+        return np.unique(np.array([zlib.crc32(g.encode('utf-8')) for g in grams], dtype=np.uint64))
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = self.shingles(text)
+        # (a * h + b) mod p for every permutation and shingle; a, h < 2^32 so no overflow
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def find(self, texts: List[str]) -> DedupResult:
+        """Cluster near-duplicate texts; the first chunk of each cluster is kept."""
+        signatures = np.stack([self.signature(text) for text in texts]) if texts else np.empty((0, self.num_perm))
+
+        # Union-find over candidate pairs from LSH buckets
+        parent = list(range(len(texts)))
+
+        def root(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for band in range(self.bands):
+            buckets = defaultdict(list)
+            band_slice = signatures[:, band * self.rows:(band + 1) * self.rows]
+            for pos, row in enumerate(band_slice):
+                buckets[row.tobytes()].append(pos)
+
+            for members in buckets.values():
+                first = members[0]
+                for other in members[1:]:
+                    a, b = root(first), root(other)
+                    if a == b:
+                        continue
+                    if np.mean(signatures[first] == signatures[other]) >= self.threshold:
+                        parent[max(a, b)] = min(a, b)
+
+        duplicates: Dict[int, List[int]] = defaultdict(list)
+        keep = []
+        for pos in range(len(texts)):
+            r = root(pos)
+            if r == pos:
+                keep.append(pos)
+            else:
+                duplicates[r].append(pos)
+
+        dropped = [pos for members in duplicates.values() for pos in members]
+        return DedupResult(
+            keep=keep,
+            duplicates=dict(duplicates),
+            chunks_saved=len(dropped),
+            bytes_saved=sum(len(texts[pos].encode('utf-8')) for pos in dropped),
+        )
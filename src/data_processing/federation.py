@@ -0,0 +1,165 @@
+# Поиск сразу по нескольким индексам (суды / годы), каждый индекс грузится и выгружается отдельно
+
+import os
+import sys
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+from sentence_transformers import SentenceTransformer
+from dotenv import load_dotenv
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from src.data_processing.vector_db import VectorDB, check_expand_mode
+from src.utils.logger import get_module_logger
+
+# Load environment variables from .env.example in project root
+load_dotenv(dotenv_path=Path(__file__).resolve().parents[2] / '.env.example')
+
+logger = get_module_logger('federation')
+
+INDEX_FILE = "legal_docs.index"
+
+
+class FederatedVectorDB:
+    """
+    Several named VectorDB indexes searched as one.
+
+    Every subdirectory of VECTOR_DB_DIR that holds legal_docs.index is an
+    index named after the directory (e.g. data/vector_db/A84_2023); an index
+    lying directly in VECTOR_DB_DIR is called "default". All indexes share
+    one embedding model, so the query is embedded once and distances from
+    different indexes are comparable.
+    """
+
+    def __init__(self, indexes: Optional[Dict[str, Path]] = None, max_workers: Optional[int] = None):
+        """
+        Args:
+            indexes: name -> index directory; discovered in VECTOR_DB_DIR if not given
+            max_workers: Threads for parallel per-index search
+        """
+        project_root = Path(__file__).resolve().parents[2]
+        self.root_dir = (project_root / os.getenv('VECTOR_DB_DIR', 'data/vector_db')).resolve()
+
+        self.model_name = os.getenv('EMBEDDING_MODEL', 'cointegrated/LaBSE-en-ru')
+        self.model = SentenceTransformer(self.model_name)
+
+        self.available: Dict[str, Path] = indexes if indexes is not None else self.discover()
+        self.shards: Dict[str, VectorDB] = {}
+        self._lock = threading.Lock()
+
+        # FAISS releases the GIL during search, so threads give real parallelism
+        max_workers = max_workers or int(os.getenv('FEDERATION_THREADS', '4'))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='federation')
+
+    def discover(self) -> Dict[str, Path]:
+        """Find index directories in VECTOR_DB_DIR."""
+        found = {}
+        if (self.root_dir / INDEX_FILE).exists():
+            found["default"] = self.root_dir
+        if self.root_dir.exists():
+            for path in sorted(self.root_dir.iterdir()):
+                if path.is_dir() and (path / INDEX_FILE).exists():
+                    found[path.name] = path
+        return found
+
+    @property
+    def loaded(self) -> List[str]:
+        return list(self.shards)
+
+    def load(self, name: str) -> VectorDB:
+        """Load a named index into memory (no-op if already loaded)."""
+        with self._lock:
+            if name in self.shards:
+                return self.shards[name]
+            if name not in self.available:
+                raise KeyError(f"Unknown index: {name}")
+            path = self.available[name]
+
+        # Reading from disk happens outside the lock so searches on other indexes go on
+        db = VectorDB(vector_db_dir=path, model=self.model)
+        db.load_index()
+
+        with self._lock:
+            # Another thread may have loaded the same index meanwhile; keep the first one
+            if name in self.shards:
+                return self.shards[name]
+            self.shards[name] = db
+        logger.info(f"Loaded index {name}: {db.index.ntotal} vectors")
+        return db
+
+    def unload(self, name: str):
+        """Drop a named index from memory."""
+        with self._lock:
+            if self.shards.pop(name, None) is not None:
+                logger.info(f"Unloaded index {name}")
+
+    def load_all(self):
+        for name in self.available:
+            self.load(name)
+
+    def search(self, query: str, k: int = 5, indexes: Optional[List[str]] = None,
+               expand: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Search several indexes in parallel and merge the results by distance.
+
+        Args:
+            query: The search query
+            k: Number of results to return in total
+            indexes: Names of loaded indexes to search; all loaded ones by default
+            expand: Context expansion mode, as in VectorDB.search; by default
+                every index uses its own SEARCH_EXPAND setting
+
+        Returns:
+            Top-k chunks over all searched indexes, each with an "индекс" field
+        """
+        if expand is not None:
+            check_expand_mode(expand)
+
+        with self._lock:
+            names = indexes if indexes is not None else list(self.shards)
+            missing = [name for name in names if name not in self.shards]
+            if missing:
+                raise KeyError(f"Indexes not loaded: {', '.join(missing)}")
+            shards = {name: self.shards[name] for name in names}
+
+        if not shards:
+            return []
+
+        query_embedding = self.model.encode([query], convert_to_numpy=True)
+
+        futures = {
+            name: self.executor.submit(db.search_embedding, query_embedding, k)
+            for name, db in shards.items()
+        }
+        candidates = [
+            (distance, name, idx)
+            for name, future in futures.items()
+            for distance, idx in future.result()
+        ]
+        top = heapq.nsmallest(k, candidates)
+
+        # Expand per index, sharing the context budget in proportion to the hits
+        by_hit = {}
+        for name, db in shards.items():
+            hits = [idx for _, hit_name, idx in top if hit_name == name]
+            if not hits:
+                continue
+            mode = expand or db.expand_mode
+            if mode == "none":
+                for idx in hits:
+                    by_hit[(name, idx)] = dict(db.documents[idx], индекс=name)
+                continue
+            budget = db.context_token_budget * len(hits) // len(top)
+            for idx, result in db._expand_runs(hits, mode, db.expand_window, budget):
+                by_hit[(name, idx)] = dict(result, индекс=name)
+
+        return [by_hit[(name, idx)] for _, name, idx in top if (name, idx) in by_hit]
+
+
+if __name__ == "__main__":
+    fed = FederatedVectorDB()
+    fed.load_all()
+    for result in fed.search("Какие основания для расторжения договора аренды?", k=3):
+        print(result["индекс"], result.get("section"), result.get("chunk_index"))
@@ -1,6 +1,5 @@
 # Парсим решение в JSON
 
-import re
 import json
 import os
 from pathlib import Path
@@ -17,6 +16,7 @@ load_dotenv(dotenv_path=Path(__file__).resolve().parents[2] / '.env.example')
 
 sys.path.append(str(Path(__file__).resolve().parents[2]))
 from src.utils.logger import get_module_logger
+from src.data_processing.citations import extract_articles
 
 logger = get_module_logger('parser')
 
@@ -42,21 +42,8 @@ class RussianLegalDocParser:
         return text
     
     def extract_articles(self, text: str) -> List[str]:
-        """Extract referenced legal articles using regex patterns."""
-        # Common patterns in Russian legal documents
-        patterns = [
-            r'ст\.\s*(\d+)\s*ГК\s*РФ',
-            r'статьи?\s*(\d+)\s*Гражданского\s*кодекса',
-            r'статьи?\s*(\d+)\s*ГК\s*РФ'
-        ]
-        
-        articles = set()
-        for pattern in patterns:
-            matches = re.finditer(pattern, text)
-            for match in matches:
-                articles.add(f"Статья {match.group(1)} ГК РФ")
-        
-        return sorted(list(articles))
+        """Extract referenced ГК/АПК/НК/КоАП articles as normalized ids ("ст.395 ГК РФ")."""
+        return extract_articles(text)
     
     def extract_sections(self, text: str) -> Dict[str, str]:
         """Extract fabula and decision sections from the text."""
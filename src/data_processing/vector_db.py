@@ -1,15 +1,23 @@
 # Реализовываем локальное хранилище (поскольку тест), FAISS
 
 import os
+import sys
 import json
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 from dotenv import load_dotenv
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from src.data_processing.citations import CitationIndex, normalize_article
+from src.data_processing.dedup import NearDuplicateDetector
+from src.utils.logger import get_module_logger
+
+logger = get_module_logger('vector_db')
+
 # Load environment variables from .env.example in project root
 load_dotenv(dotenv_path=Path(__file__).resolve().parents[2] / '.env.example')
 
@@ -17,27 +25,63 @@ load_dotenv(dotenv_path=Path(__file__).resolve().parents[2] / '.env.example')
 # from openai import OpenAI
 # client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+EXPAND_MODES = ("none", "neighbors", "section")
+
+
+def check_expand_mode(mode: str) -> str:
+    """Return the context expansion mode or raise ValueError for an unknown one."""
+    if mode not in EXPAND_MODES:
+        raise ValueError(f"Unknown expansion mode {mode!r}, expected one of: {', '.join(EXPAND_MODES)}")
+    return mode
+
+
 class VectorDB:
-    def __init__(self):
-        """Initialize the vector database using environment variables."""
+    def __init__(self, vector_db_dir: Optional[Path] = None, model: Optional[SentenceTransformer] = None):
+        """
+        Initialize the vector database using environment variables.
+        
+        Args:
+            vector_db_dir: Directory of the index files; defaults to VECTOR_DB_DIR
+            model: Already loaded embedding model to share between several databases
+        """
         project_root = Path(__file__).resolve().parents[2]  # подняться на 2 уровня выше от этого файла
         
         data_dir = os.getenv('DATA_DIR', 'data')
         self.data_root = (project_root / data_dir).resolve()
 
         self.processed_dir = self.data_root / os.getenv('PROCESSED_DATA_DIR', 'processed')
-        vector_db_dir = os.getenv('VECTOR_DB_DIR', 'data/vector_db')
+        if vector_db_dir is None:
+            vector_db_dir = os.getenv('VECTOR_DB_DIR', 'data/vector_db')
         self.vector_db_dir = (project_root / vector_db_dir).resolve()
         self.vector_db_dir.mkdir(parents=True, exist_ok=True)
         
         # Initialize the embedding model
         self.model_name = os.getenv('EMBEDDING_MODEL', 'cointegrated/LaBSE-en-ru')
-        self.model = SentenceTransformer(self.model_name)
+        self.model = model if model is not None else SentenceTransformer(self.model_name)
         self.vector_size = self.model.get_sentence_embedding_dimension()
         
         # Initialize FAISS index
         self.index = faiss.IndexFlatL2(self.vector_size)
         self.documents: List[Dict[str, Any]] = []
+        
+        # Context expansion settings: none / neighbors / section
+        self.expand_mode = check_expand_mode(os.getenv('SEARCH_EXPAND', 'none'))
+        self.expand_window = int(os.getenv('SEARCH_EXPAND_WINDOW', '1'))
+        self.context_token_budget = int(os.getenv('CONTEXT_TOKEN_BUDGET', '2000'))
+        
+        # (документ, section) -> {chunk_index: position in self.documents}
+        self.section_slots: Dict[Tuple[str, str], Dict[int, int]] = {}
+        self.chunk_section: List[Tuple[str, str]] = []
+        # Every document a vector stands for: its own plus collapsed duplicates
+        self.chunk_docs: List[Tuple[str, ...]] = []
+        
+        # Article -> documents/chunks, used for "cases citing X" and boosting
+        self.citations = CitationIndex()
+        self.article_boost = float(os.getenv('ARTICLE_BOOST', '0.2'))
+        self.article_boost_pool = int(os.getenv('ARTICLE_BOOST_POOL', '3'))
+        
+        # Near-duplicate chunks are collapsed before embedding; 0 turns it off
+        self.dedup_threshold = float(os.getenv('DEDUP_THRESHOLD', '0.9'))
 
 
         
@@ -67,10 +111,13 @@ class VectorDB:
         
         return embeddings
     
-    def process_document(self, doc: Dict[str, Any]) -> tuple[List[str], List[Dict]]:
+    def process_document(self, doc: Dict[str, Any], doc_id: Optional[str] = None) -> tuple[List[str], List[Dict]]:
         """Process a single document into chunks with metadata."""
         chunks = []
         chunk_metadata = []
+        articles = list(dict.fromkeys(
+            article for article in map(normalize_article, doc.get("статьи", [])) if article
+        ))
 
         # Разбиваем фабулу на чанки
         fabula_chunks = self.chunk_text(doc.get("фабула", ""))
@@ -78,9 +125,10 @@ class VectorDB:
             chunks.append(chunk)
             chunk_metadata.append({
                 "тип_акта": doc.get("тип_акта", None),
+                "документ": doc_id,
                 "section": "фабула",
                 "chunk_index": i,
-                "статьи": doc.get("статьи", []),
+                "статьи": articles,
                 "номер_дела": doc.get("номер_дела", "неизвестен"),
                 "дата": doc.get("дата", "неизвестна"),
                 "фабула": chunk  # если хочешь сразу текст чанка хранить
@@ -93,9 +141,11 @@ class VectorDB:
             chunks.append(chunk)
             chunk_metadata.append({
                 "тип_акта": doc.get("тип_акта", None),
+                "документ": doc_id,
                 "section": "решение",
                 "chunk_index": i,
-                "статьи": doc.get("статьи", [])
+                "статьи": articles,
+                "решение": chunk
             })
 
         return chunks, chunk_metadata
@@ -111,24 +161,67 @@ class VectorDB:
             with open(json_file, 'r', encoding='utf-8') as f:
                 doc = json.load(f)
                 
-            chunks, metadata = self.process_document(doc)
+            chunks, metadata = self.process_document(doc, doc_id=json_file.stem)
             all_chunks.extend(chunks)
             all_metadata.extend(metadata)
         
+        if self.dedup_threshold > 0:
+            all_chunks, all_metadata = self.deduplicate(all_chunks, all_metadata)
+        
         # Generate embeddings and add to index
         embeddings = self.get_embeddings(all_chunks)
         self.index.add(embeddings.astype(np.float32))
         
         # Save metadata
         self.documents = all_metadata
+        self._build_section_ranges()
+        self._build_citations()
         
         # Save index and metadata
         self.save_index()
     
+    def deduplicate(self, chunks: List[str], metadata: List[Dict]) -> tuple[List[str], List[Dict]]:
+        """
+        Collapse near-duplicate chunks into one vector.
+        
+        The kept chunk gets a "дубликаты" list describing where the collapsed
+        copies came from, so every source document stays visible in answers.
+        """
+        detector = NearDuplicateDetector(threshold=self.dedup_threshold)
+        result = detector.find(chunks)
+        
+        kept_chunks, kept_metadata = [], []
+        for pos in result.keep:
+            meta = metadata[pos]
+            if pos in result.duplicates:
+                meta = dict(meta)
+                meta["дубликаты"] = [
+                    {
+                        "документ": metadata[dup].get("документ"),
+                        "section": metadata[dup].get("section"),
+                        "chunk_index": metadata[dup].get("chunk_index"),
+                        "номер_дела": metadata[dup].get("номер_дела", "неизвестен"),
+                        "дата": metadata[dup].get("дата", "неизвестна"),
+                        "статьи": metadata[dup].get("статьи", [])
+                    }
+                    for dup in result.duplicates[pos]
+                ]
+            kept_chunks.append(chunks[pos])
+            kept_metadata.append(meta)
+        
+        vector_bytes = result.chunks_saved * self.vector_size * np.dtype(np.float32).itemsize
+        logger.info(
+            f"Dedup (threshold {self.dedup_threshold}): {result.chunks_saved} of {len(chunks)} chunks "
+            f"collapsed into {result.clusters} groups, saved {result.bytes_saved} bytes of text "
+            f"and {vector_bytes} bytes of vectors"
+        )
+        return kept_chunks, kept_metadata
+    
     def save_index(self):
-        """Save the FAISS index and document metadata."""
+        """Save the FAISS index, document metadata and citation index."""
         index_path = self.vector_db_dir / "legal_docs.index"
         metadata_path = self.vector_db_dir / "metadata.json"
+        citations_path = self.vector_db_dir / "citations.json"
         
         # Save FAISS index
         faiss.write_index(self.index, str(index_path))
@@ -136,11 +229,14 @@ class VectorDB:
         # Save metadata
         with open(metadata_path, 'w', encoding='utf-8') as f:
             json.dump(self.documents, f, ensure_ascii=False, indent=2)
+        
+        self.citations.save(citations_path)
     
     def load_index(self):
-        """Load the FAISS index and document metadata."""
+        """Load the FAISS index, document metadata and citation index."""
         index_path = self.vector_db_dir / "legal_docs.index"
         metadata_path = self.vector_db_dir / "metadata.json"
+        citations_path = self.vector_db_dir / "citations.json"
         
         if not index_path.exists() or not metadata_path.exists():
             raise FileNotFoundError("Index or metadata file not found. Run build_index() first.")
@@ -151,31 +247,190 @@ class VectorDB:
         # Load metadata
         with open(metadata_path, 'r', encoding='utf-8') as f:
             self.documents = json.load(f)
+        self._build_section_ranges()
+        
+        # Indexes built before the citation index existed get it built from metadata
+        if citations_path.exists():
+            self.citations = CitationIndex.load(citations_path)
+        else:
+            self._build_citations()
     
-    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+    def _build_citations(self):
+        doc_ids = [doc_id for doc_id, _ in self.chunk_section]
+        self.citations = CitationIndex.from_metadata(self.documents, doc_ids)
+    
+    def _build_section_ranges(self):
+        """
+        Map every document section to its chunks: chunk_index -> position.
+        
+        Neighbours of a chunk are then chunk_index ±1 looked up in O(1).
+        Chunks collapsed by deduplicate() have no position of their own; their
+        slot points at the surviving vector, whose text is near-identical, so
+        a document's run of chunks has no holes. Old metadata has no
+        "документ" field; there a new document starts at a chunk_index 0 that
+        is either a фабула chunk or follows a решение chunk.
+        """
+        self.section_slots = {}
+        self.chunk_section = []
+        self.chunk_docs = []
+        legacy_doc = -1
+        prev_section = None
+        
+        for pos, meta in enumerate(self.documents):
+            section = meta.get("section", "")
+            doc_id = meta.get("документ")
+            if doc_id is None:
+                if meta.get("chunk_index") == 0 and (section == "фабула" or prev_section == "решение"):
+                    legacy_doc += 1
+                doc_id = f"#{legacy_doc}"
+            prev_section = section
+            
+            key = (doc_id, section)
+            self.section_slots.setdefault(key, {})[meta.get("chunk_index", 0)] = pos
+            self.chunk_section.append(key)
+            
+            docs = [doc_id]
+            for dup in meta.get("дубликаты", []):
+                dup_key = (dup.get("документ") or doc_id, dup.get("section", section))
+                self.section_slots.setdefault(dup_key, {}).setdefault(dup.get("chunk_index", 0), pos)
+                if dup_key[0] not in docs:
+                    docs.append(dup_key[0])
+            self.chunk_docs.append(tuple(docs))
+    
+    def _chunk_text(self, pos: int) -> str:
+        meta = self.documents[pos]
+        return meta.get(meta.get("section", ""), "")
+    
+    def _chunk_words(self, pos: int) -> int:
+        return len(self._chunk_text(pos).split())
+    
+    def expand_hits(self, indices: List[int], mode: str = "neighbors", window: int = 1,
+                    token_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Add surrounding chunks of the same document section to search hits.
+        
+        Args:
+            indices: Hit positions in self.documents, best first
+            mode: "neighbors" adds up to `window` chunks on each side,
+                "section" tries to add the whole containing section
+            window: Neighbour distance for "neighbors" mode
+            token_budget: Max total words of returned text (hits are always kept)
+            
+        Returns:
+            One result per run of consecutive chunk_index values, in hit order.
+            The section text holds the joined run and "chunk_range" its
+            first/last chunk_index.
+        """
+        return [result for _, result in self._expand_runs(indices, mode, window, token_budget)]
+    
+    def _expand_runs(self, indices: List[int], mode: str, window: int,
+                     token_budget: Optional[int]) -> List[Tuple[int, Dict[str, Any]]]:
+        """expand_hits() that also returns the hit each run was built around."""
+        check_expand_mode(mode)
+        if token_budget is None:
+            token_budget = self.context_token_budget
+        
+        # Units are (section key, chunk_index): one vector may fill slots in several documents
+        selected = {(self.chunk_section[idx], self.documents[idx].get("chunk_index", 0)) for idx in indices}
+        used = sum(self._chunk_words(idx) for idx in indices)
+        
+        for idx in indices:
+            key = self.chunk_section[idx]
+            slots = self.section_slots[key]
+            hit_index = self.documents[idx].get("chunk_index", 0)
+            if mode == "section":
+                candidates = sorted(slots, key=lambda c: abs(c - hit_index))
+            elif mode == "neighbors":
+                candidates = [c for d in range(1, window + 1) for c in (hit_index - d, hit_index + d)]
+            else:
+                candidates = []
+            
+            for c in candidates:
+                if c not in slots or (key, c) in selected:
+                    continue
+                cost = self._chunk_words(slots[c])
+                if used + cost > token_budget:
+                    break
+                selected.add((key, c))
+                used += cost
+        
+        results = []
+        emitted = set()
+        for idx in indices:
+            key = self.chunk_section[idx]
+            slots = self.section_slots[key]
+            lo = hi = self.documents[idx].get("chunk_index", 0)
+            while lo - 1 in slots and (key, lo - 1) in selected:
+                lo -= 1
+            if (key, lo) in emitted:
+                continue
+            while hi + 1 in slots and (key, hi + 1) in selected:
+                hi += 1
+            emitted.add((key, lo))
+            
+            # chunk_range and the joined text come from the same lo..hi walk
+            result = dict(self.documents[idx])
+            section = result.get("section", "")
+            result[section] = " ".join(self._chunk_text(slots[c]) for c in range(lo, hi + 1))
+            result["chunk_range"] = [lo, hi]
+            results.append((idx, result))
+        
+        return results
+    
+    def search(self, query: str, k: int = 5, expand: Optional[str] = None,
+               articles: Optional[List[str]] = None,
+               query_embedding: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
         """
         Search for similar chunks.
         
         Args:
             query: The search query
             k: Number of results to return
+            expand: Context expansion mode ("none", "neighbors", "section");
+                defaults to SEARCH_EXPAND from environment
+            articles: Articles to boost; chunks of documents citing any of them
+                get their distance reduced by ARTICLE_BOOST
+            query_embedding: Precomputed embedding of the query (shape 1 x dim),
+                e.g. from an evaluation cache; the query is not encoded then
             
         Returns:
             List of dictionaries containing the chunks and their metadata
         """
+        expand = check_expand_mode(expand or self.expand_mode)
+        
         # Generate query embedding
-        query_embedding = self.get_embeddings([query])
+        if query_embedding is None:
+            query_embedding = self.get_embeddings([query])
         
-        # Search in FAISS index
-        distances, indices = self.index.search(query_embedding.astype(np.float32), k)
+        if articles:
+            hits = self._boost_articles(self.search_embedding(query_embedding, k * self.article_boost_pool), articles, k)
+        else:
+            hits = [idx for _, idx in self.search_embedding(query_embedding, k)]
+        
+        if expand != "none":
+            return self.expand_hits(hits, mode=expand, window=self.expand_window)
         
         # Get results with metadata
-        results = []
-        for idx in indices[0]:
-            if idx != -1:  # FAISS returns -1 for not enough results
-                results.append(self.documents[idx])
-                
-        return results
+        return [self.documents[idx] for idx in hits]
+    
+    def search_embedding(self, query_embedding: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        """Search FAISS with a ready query embedding; returns (distance, position) pairs."""
+        distances, indices = self.index.search(query_embedding.astype(np.float32), k)
+        # FAISS returns -1 for not enough results
+        return [(float(d), int(idx)) for d, idx in zip(distances[0], indices[0]) if idx != -1]
+    
+    def _boost_articles(self, candidates: List[Tuple[float, int]], articles: List[str], k: int) -> List[int]:
+        """Re-rank FAISS candidates, favouring chunks of documents that cite the articles."""
+        citing = set().union(*(self.citations.documents_citing(article) for article in articles))
+        boosted = [
+            (distance * (1 - self.article_boost) if citing.intersection(self.chunk_docs[idx]) else distance, idx)
+            for distance, idx in candidates
+        ]
+        return [idx for _, idx in sorted(boosted)[:k]]
+    
+    def documents_citing(self, article: str) -> List[str]:
+        """Ids of documents that cite the article, e.g. "ст.333.40 НК РФ" or just "ст.333.40"."""
+        return sorted(self.citations.documents_citing(article))
 
 if __name__ == "__main__":
     # Initialize and build index
@@ -0,0 +1,267 @@
+# Оффлайн-оценка качества поиска: recall@k, MRR, nDCG и скорость для разных конфигураций FAISS
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+import pandas as pd
+import faiss
+from dotenv import load_dotenv
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from src.data_processing.vector_db import VectorDB
+from src.utils.logger import get_module_logger
+
+# Load environment variables from .env.example in project root
+load_dotenv(dotenv_path=Path(__file__).resolve().parents[2] / '.env.example')
+
+logger = get_module_logger('evaluation')
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_CONFIGS = ["Flat", "HNSW32", "IVF4,Flat|nprobe=2", "SQ8", "SQfp16",
+                   "search", "search|expand=neighbors", "search|articles"]
+SEARCH_CONFIG = "search"
+
+
+def load_queries(path: Path) -> List[Dict[str, Any]]:
+    """
+    Load the labelled query set.
+
+    Every entry is {"query": "...", "relevant": ["<document id>", ...]}, where a
+    document id is the processed JSON file name without extension. An optional
+    "articles" list is used for article boosting in "search|articles" configs.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        queries = json.load(f)
+    for entry in queries:
+        if not entry.get("query") or not entry.get("relevant"):
+            raise ValueError(f"Query entry needs 'query' and 'relevant': {entry}")
+    return queries
+
+
+def recall_at_k(ranked: List[str], relevant: set, k: int) -> float:
+    return len(set(ranked[:k]) & relevant) / len(relevant)
+
+
+def reciprocal_rank(ranked: List[str], relevant: set) -> float:
+    for rank, doc_id in enumerate(ranked, start=1):
+        if doc_id in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(ranked: List[str], relevant: set, k: int) -> float:
+    """Binary-relevance nDCG."""
+    dcg = sum(1.0 / np.log2(rank + 1) for rank, doc_id in enumerate(ranked[:k], start=1) if doc_id in relevant)
+    ideal = sum(1.0 / np.log2(rank + 1) for rank in range(1, min(len(relevant), k) + 1))
+    return dcg / ideal
+
+
+class RetrievalEvaluator:
+    """
+    Scores index configurations built from the vectors of the current index.
+
+    Query embeddings and exact ("gold") neighbours from a flat index are
+    cached on disk, so trying ANN/quantized configs needs neither the
+    embedding model for queries nor a brute-force search again.
+
+    Configs starting with "search" run the full VectorDB.search on the
+    current index instead (context expansion, article boosting), e.g.
+    "search|expand=section,articles".
+    """
+
+    def __init__(self, db: VectorDB, queries: List[Dict[str, Any]], k: int = 5,
+                 cache_dir: Optional[Path] = None):
+        self.db = db
+        self.queries = queries
+        self.k = k
+        self.cache_dir = cache_dir or PROJECT_ROOT / os.getenv('EVAL_CACHE_DIR', 'data/eval/cache')
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        # Labels are document ids; chunks of old indexes have none and would silently score 0
+        missing = sum(1 for meta in db.documents if not meta.get("документ"))
+        if missing:
+            raise ValueError(
+                f"{missing} of {len(db.documents)} chunks have no 'документ' id; "
+                "rebuild the index (python src/data_processing/vector_db.py) before evaluating"
+            )
+
+        # Vectors are taken back from the stored index, nothing is re-embedded
+        self.vectors = db.index.reconstruct_n(0, db.index.ntotal)
+        self.relevant = [set(entry["relevant"]) for entry in queries]
+        self.query_embeddings, self.gold = self._load_gold()
+
+    def _cache_path(self) -> Path:
+        # Size and mtime of the index files change on every rebuild, even with the same chunk count
+        files = {}
+        for name in ("legal_docs.index", "metadata.json"):
+            path = self.db.vector_db_dir / name
+            if path.exists():
+                stat = path.stat()
+                files[name] = [stat.st_size, stat.st_mtime_ns]
+        key = hashlib.sha1(json.dumps({
+            "model": self.db.model_name,
+            "ntotal": int(self.db.index.ntotal),
+            "index": str(self.db.vector_db_dir),
+            "files": files,
+            "k": self.k,
+            "queries": [entry["query"] for entry in self.queries],
+        }, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+        return self.cache_dir / f"gold_{key}.npz"
+
+    def _load_gold(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Query embeddings and exact top-k neighbour positions, from cache if possible."""
+        path = self._cache_path()
+        if path.exists():
+            cached = np.load(path)
+            logger.info(f"Gold neighbours loaded from {path}")
+            return cached["embeddings"], cached["gold"]
+
+        embeddings = self.db.get_embeddings([entry["query"] for entry in self.queries]).astype(np.float32)
+        flat = faiss.IndexFlatL2(self.vectors.shape[1])
+        flat.add(self.vectors)
+        _, gold = flat.search(embeddings, self.k)
+
+        np.savez(path, embeddings=embeddings, gold=gold)
+        logger.info(f"Gold neighbours saved to {path}")
+        return embeddings, gold
+
+    def build(self, config: str) -> Tuple[faiss.Index, float]:
+        """
+        Build an index from a config string: a faiss.index_factory description
+        optionally followed by search parameters, e.g. "IVF4,Flat|nprobe=2".
+        """
+        description, _, params = config.partition("|")
+        start = time.perf_counter()
+        index = faiss.index_factory(self.vectors.shape[1], description)
+        if not index.is_trained:
+            index.train(self.vectors)
+        index.add(self.vectors)
+        if params:
+            faiss.ParameterSpace().set_index_parameters(index, params)
+        return index, time.perf_counter() - start
+
+    @staticmethod
+    def ranked_documents(results: List[Dict[str, Any]]) -> List[str]:
+        """
+        Document ids in rank order, each document counted once.
+
+        A chunk also stands for the documents whose copies were collapsed into it.
+        """
+        ranked = []
+        for meta in results:
+            doc_ids = [meta["документ"]] + [dup["документ"] for dup in meta.get("дубликаты", [])]
+            for doc_id in doc_ids:
+                if doc_id not in ranked:
+                    ranked.append(doc_id)
+        return ranked
+
+    def evaluate(self, config: str) -> Dict[str, Any]:
+        if config.split("|", 1)[0] == SEARCH_CONFIG:
+            return self.evaluate_search(config)
+
+        index, build_seconds = self.build(config)
+
+        start = time.perf_counter()
+        _, found = index.search(self.query_embeddings, self.k)
+        search_seconds = time.perf_counter() - start
+
+        results = [[self.db.documents[pos] for pos in positions if pos != -1] for positions in found]
+        overlap = []
+        for positions, gold in zip(found, self.gold):
+            # k may exceed the index size; FAISS pads both lists with -1
+            valid_gold = set(gold[gold != -1].tolist())
+            if valid_gold:
+                overlap.append(len(set(positions.tolist()) & valid_gold) / len(valid_gold))
+
+        return self._row(config, build_seconds, search_seconds, faiss.serialize_index(index).nbytes,
+                         results, float(np.mean(overlap)) if overlap else None)
+
+    def evaluate_search(self, config: str) -> Dict[str, Any]:
+        """Score VectorDB.search itself: "search|expand=<mode>,articles"."""
+        _, _, params = config.partition("|")
+        expand, use_articles = None, False
+        for param in filter(None, (p.strip() for p in params.split(","))):
+            if param == "articles":
+                use_articles = True
+            elif param.startswith("expand="):
+                expand = param.split("=", 1)[1]
+            else:
+                raise ValueError(f"Unknown search parameter: {param}")
+
+        results = []
+        start = time.perf_counter()
+        for entry, embedding in zip(self.queries, self.query_embeddings):
+            results.append(self.db.search(
+                entry["query"], k=self.k, expand=expand,
+                articles=entry.get("articles") if use_articles else None,
+                query_embedding=embedding[None, :]
+            ))
+        search_seconds = time.perf_counter() - start
+
+        # Expanded results are merged runs of chunks, so overlap with gold positions is not defined
+        return self._row(config, 0.0, search_seconds, faiss.serialize_index(self.db.index).nbytes,
+                         results, None)
+
+    def _row(self, config: str, build_seconds: float, search_seconds: float, index_bytes: int,
+             results: List[List[Dict[str, Any]]], overlap: Optional[float]) -> Dict[str, Any]:
+        recall, rr, ndcg = [], [], []
+        for found, relevant in zip(results, self.relevant):
+            ranked = self.ranked_documents(found)
+            recall.append(recall_at_k(ranked, relevant, self.k))
+            rr.append(reciprocal_rank(ranked, relevant))
+            ndcg.append(ndcg_at_k(ranked, relevant, self.k))
+
+        return {
+            "config": config,
+            "build_s": round(build_seconds, 3),
+            "ms_per_query": round(1000 * search_seconds / len(self.queries), 3),
+            "size_mb": round(index_bytes / 2 ** 20, 2),
+            f"recall@{self.k}": round(float(np.mean(recall)), 3),
+            "MRR": round(float(np.mean(rr)), 3),
+            f"nDCG@{self.k}": round(float(np.mean(ndcg)), 3),
+            f"gold_overlap@{self.k}": None if overlap is None else round(overlap, 3),
+        }
+
+    def run(self, configs: List[str]) -> pd.DataFrame:
+        rows = []
+        for config in configs:
+            try:
+                rows.append(self.evaluate(config))
+            except Exception as e:
+                logger.error(f"Config {config} failed: {str(e)}")
+        return pd.DataFrame(rows)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Speed vs quality table for retrieval configurations")
+    parser.add_argument("--queries", type=Path, default=PROJECT_ROOT / "data/eval/queries.json",
+                        help="Labelled query set (JSON)")
+    parser.add_argument("-k", type=int, default=int(os.getenv('TOP_K_RESULTS', '3')))
+    parser.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS,
+                        help='faiss.index_factory strings, optionally with "|params"')
+    parser.add_argument("--output", type=Path, help="Also save the table as CSV")
+    args = parser.parse_args()
+
+    try:
+        db = VectorDB()
+        db.load_index()
+        evaluator = RetrievalEvaluator(db, load_queries(args.queries), k=args.k)
+        table = evaluator.run(args.configs)
+    except Exception as e:
+        logger.critical(f"Фатальная ошибка: {str(e)}", exc_info=True)
+        return 1
+
+    print(table.to_string(index=False))
+    if args.output:
+        table.to_csv(args.output, index=False)
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
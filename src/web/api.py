@@ -0,0 +1,244 @@
+# HTTP API рядом со Streamlit: параллельные запросы, склейка одинаковых вопросов, очередь с 429
+
+import os
+import sys
+import asyncio
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from src.app import LegalRAG, YANDEX_TIMEOUT
+from src.utils.logger import get_module_logger
+
+# Load environment variables from .env.example in project root
+load_dotenv(dotenv_path=Path(__file__).resolve().parents[2] / '.env.example')
+
+logger = get_module_logger('api')
+
+
+class QueueFullError(Exception):
+    """Raised when the request queue has no free slots."""
+
+
+class CoalescingQueue:
+    """
+    Bounded job queue where identical in-flight jobs share one computation.
+
+    Jobs are keyed; while a job with some key is queued or running, every
+    new submit with the same key awaits the same future instead of adding
+    another job. New keys are rejected with QueueFullError when the queue is full.
+    """
+
+    def __init__(self, maxsize: int, workers: int):
+        self.maxsize = maxsize
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._inflight: Dict[Any, asyncio.Future] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        """Start worker tasks on the running event loop."""
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancel worker tasks and fail jobs that never ran."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for future in self._inflight.values():
+            if not future.done():
+                future.cancel()
+        self._inflight.clear()
+
+    async def submit(self, key: Any, job: Callable[[], Awaitable[Any]]) -> Any:
+        """Run job (or join the identical in-flight one) and return its result."""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            try:
+                self._queue.put_nowait((key, job, future))
+            except asyncio.QueueFull:
+                raise QueueFullError(f"Request queue is full ({self.maxsize})")
+            self._inflight[key] = future
+        # shield: one client disconnecting must not cancel the shared computation
+        return await asyncio.shield(future)
+
+    async def _worker(self):
+        while True:
+            key, job, future = await self._queue.get()
+            try:
+                result = await job()
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._inflight.pop(key, None)
+                self._queue.task_done()
+
+
+MAX_TOP_K = int(os.getenv('API_MAX_TOP_K', '20'))
+
+
+class SlotStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that frees a streaming slot exactly once on every exit.
+
+    Starlette may cancel the response before the body generator starts (client
+    disconnects right after the headers), so the generator's own finally is
+    not enough; the slot is also released when the response call returns.
+    """
+
+    def __init__(self, content, release: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+        self._released = False
+
+    def release_once(self):
+        if not self._released:
+            self._released = True
+            self._release()
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release_once()
+
+
+class Question(BaseModel):
+    query: str
+    top_k: Optional[int] = Field(default=None, ge=1, le=MAX_TOP_K)
+
+
+class Answer(BaseModel):
+    answer: str
+
+
+rag: Optional[LegalRAG] = None
+retrieval_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv('API_RETRIEVAL_THREADS', '4')),
+    thread_name_prefix='retrieval'
+)
+jobs = CoalescingQueue(
+    maxsize=int(os.getenv('API_QUEUE_SIZE', '32')),
+    workers=int(os.getenv('API_WORKERS', '8'))
+)
+# Streaming answers are generated per client, outside the queue; this bounds them the same way
+stream_slots = int(os.getenv('API_STREAM_SLOTS', os.getenv('API_WORKERS', '8')))
+stream_semaphore: Optional[asyncio.Semaphore] = None
+
+OVERLOADED = "Сервер перегружен, повторите запрос позже"
+
+
+def normalize_query(query: str) -> str:
+    """Key used to detect identical questions."""
+    return " ".join(query.split()).lower()
+
+
+async def retrieve(query: str, k: int) -> List[Dict[str, Any]]:
+    """Run the blocking embedding + FAISS search in the thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(retrieval_pool, rag.vector_db.search, query, k)
+
+
+async def answer_job(query: str, k: int) -> str:
+    relevant_chunks = await retrieve(query, k)
+    prompt = rag.format_prompt(query, relevant_chunks)
+    answer = await rag.aget_yandex_answer(prompt)
+    return rag.format_output(answer, relevant_chunks)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global rag, stream_semaphore
+    rag = LegalRAG()
+    rag.http_client = httpx.AsyncClient(timeout=YANDEX_TIMEOUT)
+    stream_semaphore = asyncio.Semaphore(stream_slots)
+    jobs.start()
+    logger.info("API started")
+    yield
+    await jobs.stop()
+    await rag.aclose()
+    retrieval_pool.shutdown(wait=False)
+
+
+app = FastAPI(title="Юридический помощник API", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.post("/answer", response_model=Answer)
+async def answer(question: Question):
+    query = question.query.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Пустой вопрос")
+    k = rag.top_k if question.top_k is None else question.top_k
+
+    try:
+        result = await jobs.submit(("answer", normalize_query(query), k), lambda: answer_job(query, k))
+    except QueueFullError as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=429, detail=OVERLOADED)
+    return Answer(answer=result)
+
+
+@app.post("/answer/stream")
+async def answer_stream(question: Question):
+    query = question.query.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Пустой вопрос")
+    k = rag.top_k if question.top_k is None else question.top_k
+
+    # Generation slot is taken up front so an overloaded server answers 429, not a stalled stream
+    if stream_semaphore.locked():
+        logger.warning(f"All {stream_slots} streaming slots are busy")
+        raise HTTPException(status_code=429, detail=OVERLOADED)
+    await stream_semaphore.acquire()
+
+    # Retrieval is shared between identical streams; generation is per client
+    try:
+        relevant_chunks = await jobs.submit(("search", normalize_query(query), k), lambda: retrieve(query, k))
+    except QueueFullError as e:
+        stream_semaphore.release()
+        logger.warning(str(e))
+        raise HTTPException(status_code=429, detail=OVERLOADED)
+    except BaseException:
+        stream_semaphore.release()
+        raise
+
+    async def body():
+        try:
+            prompt = rag.format_prompt(query, relevant_chunks)
+            prefix = "Ответ: "
+            yield prefix
+            async for delta in rag.astream_yandex_answer(prompt):
+                yield delta
+            # Sources block is the same as in the non-streaming answer
+            yield rag.format_output("", relevant_chunks)[len(prefix):]
+        finally:
+            response.release_once()
+
+    response = SlotStreamingResponse(body(), release=stream_semaphore.release,
+                                     media_type="text/plain; charset=utf-8")
+    return response
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=os.getenv('API_HOST', '0.0.0.0'), port=int(os.getenv('API_PORT', '8000')))